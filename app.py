@@ -1,16 +1,74 @@
 from flask import Flask, render_template, request, jsonify
 from werkzeug.utils import secure_filename
 import os
+from contextlib import contextmanager
 from datetime import datetime
 from sip_utils import extract_sip_messages, filter_messages, compare_messages, highlight_text_differences
+from capture_store import (CaptureStore, capture_key, is_capture_key,
+                           DEFAULT_STORE_DIR, DEFAULT_MAX_BYTES, DEFAULT_LEASE_SECONDS)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+app.config['CAPTURE_STORE_DIR'] = os.environ.get('CAPTURE_STORE_DIR', DEFAULT_STORE_DIR)
+app.config['CAPTURE_STORE_MAX_BYTES'] = int(os.environ.get('CAPTURE_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+app.config['CAPTURE_STORE_LEASE_SECONDS'] = int(os.environ.get('CAPTURE_STORE_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def get_capture_store():
+    # Parsed captures shared by all gunicorn workers on this host. Built on
+    # first use; where it can't be (no fcntl, store directory not writable)
+    # captures are simply parsed per request.
+    if 'capture_store' not in app.extensions:
+        try:
+            store = CaptureStore(app.config['CAPTURE_STORE_DIR'],
+                                 app.config['CAPTURE_STORE_MAX_BYTES'],
+                                 app.config['CAPTURE_STORE_LEASE_SECONDS'])
+        except OSError:
+            store = None
+        app.extensions['capture_store'] = store
+    return app.extensions['capture_store']
+
+def load_capture(filepath):
+    # Reuse a capture already parsed by any worker; otherwise parse and share it.
+    # The capture id is None when the capture couldn't be stored.
+    store = get_capture_store()
+    if store is None:
+        return None, extract_sip_messages(filepath)
+    key = capture_key(filepath)
+    with store.open(key) as messages:
+        if messages is not None:
+            return key, messages
+    messages = extract_sip_messages(filepath)
+    if not store.put(key, messages):
+        key = None
+    return key, messages
+
+class CaptureNotFound(Exception):
+    pass
+
+@contextmanager
+def request_messages(data, capture_field, messages_field):
+    # Prefer a stored capture id over a re-sent message list
+    key = data.get(capture_field)
+    if not key:
+        yield data.get(messages_field, [])
+        return
+    store = get_capture_store()
+    if store is None or not is_capture_key(key):
+        raise CaptureNotFound(key)
+    with store.open(key) as messages:
+        if messages is None:
+            raise CaptureNotFound(key)
+        yield messages
+
+@app.errorhandler(CaptureNotFound)
+def capture_not_found(e):
+    return jsonify({'error': 'Capture not found, please upload the file again'}), 404
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -31,13 +89,13 @@ def upload_file():
         filename1 = secure_filename(file1.filename)
         filepath1 = os.path.join(app.config['UPLOAD_FOLDER'], filename1)
         file1.save(filepath1)
-        messages1 = extract_sip_messages(filepath1)
+        capture1, messages1 = load_capture(filepath1)
         
         # Save and process second file
         filename2 = secure_filename(file2.filename)
         filepath2 = os.path.join(app.config['UPLOAD_FOLDER'], filename2)
         file2.save(filepath2)
-        messages2 = extract_sip_messages(filepath2)
+        capture2, messages2 = load_capture(filepath2)
         
         # Clean up uploaded files
         os.remove(filepath1)
@@ -45,7 +103,9 @@ def upload_file():
         
         return jsonify({
             'pcap1': messages1,
-            'pcap2': messages2
+            'pcap2': messages2,
+            'capture1': capture1,
+            'capture2': capture2
         })
     
     except Exception as e:
@@ -54,9 +114,13 @@ def upload_file():
 @app.route('/compare', methods=['POST'])
 def compare():
     data = request.get_json()
-    messages1 = data.get('pcap1', [])
-    messages2 = data.get('pcap2', [])
     threshold = float(data.get('threshold', 0.8))
+    with request_messages(data, 'capture1', 'pcap1') as messages1, \
+            request_messages(data, 'capture2', 'pcap2') as messages2:
+        unmatched1, unmatched2 = find_unmatched(messages1, messages2, threshold)
+    return jsonify({'unmatched1': unmatched1, 'unmatched2': unmatched2})
+
+def find_unmatched(messages1, messages2, threshold):
     # Find messages in pcap1 not matched in pcap2 and vice versa
     unmatched1 = []
     unmatched2 = []
@@ -76,15 +140,15 @@ def compare():
                 break
         if not found:
             unmatched2.append(i)
-    return jsonify({'unmatched1': unmatched1, 'unmatched2': unmatched2})
+    return unmatched1, unmatched2
 
 @app.route('/filter', methods=['POST'])
 def filter_endpoint():
     data = request.get_json()
-    messages = data.get('messages', [])
     msg_type = data.get('msg_type', 'ALL')
     callid_filter = data.get('callid_filter', '')
-    filtered = filter_messages(messages, msg_type, callid_filter)
+    with request_messages(data, 'capture', 'messages') as messages:
+        filtered = filter_messages(messages, msg_type, callid_filter)
     return jsonify({'filtered': filtered})
 
 @app.route('/diff', methods=['POST'])
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, callers parse captures directly
+    fcntl = None
+
+# Default location: /dev/shm is RAM-backed on Linux, so cached captures never
+# touch the disk. Docker only gives containers 64MB of it unless --shm-size is
+# set, so the store caps itself to the space actually there (see CaptureStore).
+DEFAULT_STORE_DIR = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'sipcap-store')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_LEASE_SECONDS = 10 * 60
+
+_TMP_PREFIX = 'sipcap-'
+# Files the store creates itself; nothing else in its directory is touched
+_STORE_FILE = re.compile(r'[0-9a-f]{64}\.json|%s.*\.tmp|index\.json\.tmp' % _TMP_PREFIX)
+
+
+# --- Capture Keys ---
+def capture_key(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_capture_key(key):
+    return isinstance(key, str) and re.fullmatch(r'[0-9a-f]{64}', key) is not None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# --- Shared Capture Store ---
+class CaptureStore:
+    """Cache of parsed captures shared by all worker processes on one host.
+
+    A capture is parsed once by whichever worker receives it and written as
+    JSON; any worker can then load it instead of re-parsing the pcap. Loading
+    still decodes a private copy in the worker for the request's duration.
+
+    A small index (guarded by an flock) tracks per-process reference counts,
+    which pin a capture while a worker is reading it, and a lease renewed on
+    every store and load, which keeps it around between ``/upload`` and the
+    following ``/compare`` or ``/filter``. Only captures with neither are
+    evicted, least-recently-used first, to make room for new ones. Capture
+    ids are therefore cache handles: once a lease expires the capture may be
+    evicted and the client has to upload it again.
+
+    ``max_bytes`` is capped to half the size of the filesystem holding the
+    store so writes don't run out of space before eviction kicks in.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        if fcntl is None:
+            raise OSError('capture store requires fcntl')
+        os.makedirs(directory, exist_ok=True)
+        st = os.statvfs(directory)
+        self.directory = directory
+        self.max_bytes = min(max_bytes, st.f_frsize * st.f_blocks // 2)
+        self.lease_seconds = lease_seconds
+        self._index_path = os.path.join(directory, 'index.json')
+        self._lock_path = os.path.join(directory, 'index.lock')
+
+    def _data_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    @contextmanager
+    def _locked_index(self):
+        # Yields (index, loaded); loaded is False when no readable index was
+        # found, in which case the empty index may not reflect what is stored.
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._index_path) as f:
+                        raw = f.read()
+                    index = json.loads(raw)
+                    loaded = True
+                except (OSError, ValueError):
+                    raw, index, loaded = None, {}, False
+                yield index, loaded
+                updated = json.dumps(index)
+                if updated != raw:
+                    tmp_path = self._index_path + '.tmp'
+                    with open(tmp_path, 'w') as f:
+                        f.write(updated)
+                    os.replace(tmp_path, self._index_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _remove_orphans(self, index):
+        # Data is only written while holding the lock, so any temp file or
+        # capture the index doesn't know about was left by a crashed worker.
+        for name in os.listdir(self.directory):
+            if not _STORE_FILE.fullmatch(name) or name[:-5] in index:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if stat.S_ISREG(os.lstat(path).st_mode):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _make_room(self, index, size):
+        total = sum(entry['size'] for entry in index.values())
+        if total + size <= self.max_bytes:
+            return True
+        # Drop references held by workers that have since died, then evict
+        # captures nobody holds, oldest first, until the new one fits.
+        now = time.time()
+        for entry in index.values():
+            entry['refs'] = {pid: n for pid, n in entry['refs'].items() if _pid_alive(int(pid))}
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total + size <= self.max_bytes:
+                break
+            entry = index[key]
+            if entry['refs'] or entry['lease_until'] > now:
+                continue
+            total -= entry['size']
+            del index[key]
+            try:
+                os.remove(self._data_path(key))
+            except FileNotFoundError:
+                pass
+        return total + size <= self.max_bytes
+
+    def _write(self, key, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=_TMP_PREFIX, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._data_path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def put(self, key, messages):
+        """Store parsed messages under ``key``; return whether they were stored.
+
+        Captures too large for the store, or that can't be fitted without
+        evicting ones still in use, are not stored.
+        """
+        data = json.dumps(messages).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return False
+        try:
+            with self._locked_index() as (index, loaded):
+                now = time.time()
+                entry = index.get(key)
+                if entry is not None:
+                    # Another worker stored the same capture first
+                    entry['last_used'] = now
+                    entry['lease_until'] = now + self.lease_seconds
+                    return True
+                if loaded:
+                    self._remove_orphans(index)
+                if not self._make_room(index, len(data)):
+                    return False
+                try:
+                    self._write(key, data)
+                except OSError:
+                    return False
+                index[key] = {'size': len(data), 'refs': {}, 'last_used': now,
+                              'lease_until': now + self.lease_seconds}
+                return True
+        except OSError:
+            return False
+
+    def _acquire(self, key):
+        with self._locked_index() as (index, _):
+            entry = index.get(key)
+            if entry is None:
+                return False
+            if not os.path.exists(self._data_path(key)):
+                del index[key]
+                return False
+            now = time.time()
+            pid = str(os.getpid())
+            entry['refs'][pid] = entry['refs'].get(pid, 0) + 1
+            entry['last_used'] = now
+            entry['lease_until'] = now + self.lease_seconds
+            return True
+
+    def _release(self, key):
+        with self._locked_index() as (index, _):
+            entry = index.get(key)
+            if entry is None:
+                return
+            pid = str(os.getpid())
+            count = entry['refs'].get(pid, 0) - 1
+            if count > 0:
+                entry['refs'][pid] = count
+            else:
+                entry['refs'].pop(pid, None)
+
+    @contextmanager
+    def open(self, key):
+        """Yield the parsed messages for ``key``, or None if not stored or unreadable.
+
+        The capture is pinned against eviction for the duration of the block.
+        """
+        try:
+            acquired = is_capture_key(key) and self._acquire(key)
+        except OSError:
+            acquired = False
+        if not acquired:
+            yield None
+            return
+        try:
+            try:
+                with open(self._data_path(key), 'rb') as f:
+                    messages = json.load(f)
+            except (OSError, ValueError):
+                messages = None
+            yield messages
+        finally:
+            self._release(key)
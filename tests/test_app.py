@@ -0,0 +1,81 @@
+import io
+
+import pytest
+from scapy.all import IP, UDP, Raw, wrpcap
+
+import app as app_module
+import capture_store
+
+INVITE = 'INVITE sip:bob@example.com SIP/2.0\r\nCall-ID: call-1\r\n\r\n'
+BYE = 'BYE sip:bob@example.com SIP/2.0\r\nCall-ID: call-2\r\n\r\n'
+
+
+@pytest.fixture
+def pcap_bytes(tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    wrpcap(path, [IP() / UDP(sport=5060, dport=5060) / Raw(load=payload) for payload in (INVITE, BYE)])
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app_module.app.config, 'CAPTURE_STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.delitem(app_module.app.extensions, 'capture_store', raising=False)
+    return app_module.app.test_client()
+
+
+def upload(client, pcap_bytes):
+    return client.post('/upload', data={
+        'file1': (io.BytesIO(pcap_bytes), 'one.pcap'),
+        'file2': (io.BytesIO(pcap_bytes), 'two.pcap'),
+    })
+
+
+def test_upload_returns_capture_ids(client, pcap_bytes):
+    data = upload(client, pcap_bytes).get_json()
+    assert [msg['first_line'] for msg in data['pcap1']] == ['INVITE sip:bob@example.com SIP/2.0', 'BYE sip:bob@example.com SIP/2.0']
+    assert capture_store.is_capture_key(data['capture1'])
+    assert data['capture1'] == data['capture2']
+
+
+def test_upload_reuses_stored_capture(client, pcap_bytes, monkeypatch):
+    first = upload(client, pcap_bytes).get_json()
+
+    def fail(filepath):
+        raise AssertionError('capture parsed again')
+    monkeypatch.setattr(app_module, 'extract_sip_messages', fail)
+    second = upload(client, pcap_bytes).get_json()
+    assert second['pcap1'] == first['pcap1']
+
+
+def test_capture_id_preferred_over_messages(client, pcap_bytes):
+    capture = upload(client, pcap_bytes).get_json()['capture1']
+    response = client.post('/filter', json={'capture': capture, 'messages': [], 'msg_type': 'BYE'})
+    assert [msg['call_id'] for msg in response.get_json()['filtered']] == ['call-2']
+    response = client.post('/compare', json={'capture1': capture, 'capture2': capture})
+    assert response.get_json() == {'unmatched1': [], 'unmatched2': []}
+
+
+def test_message_lists_still_accepted(client):
+    messages = [{'first_line': 'BYE sip:bob SIP/2.0', 'call_id': 'call-2', 'message': BYE, 'time': 0.0}]
+    response = client.post('/filter', json={'messages': messages, 'msg_type': 'BYE'})
+    assert response.get_json()['filtered'] == messages
+
+
+@pytest.mark.parametrize('capture', ['0' * 64, ['x'], '../index'])
+def test_unknown_or_invalid_capture_is_404(client, capture):
+    response = client.post('/filter', json={'capture': capture})
+    assert response.status_code == 404
+    response = client.post('/compare', json={'capture1': capture, 'pcap2': []})
+    assert response.status_code == 404
+
+
+def test_parses_per_request_without_store(client, pcap_bytes, monkeypatch):
+    monkeypatch.setattr(capture_store, 'fcntl', None)
+    data = upload(client, pcap_bytes).get_json()
+    assert data['capture1'] is None
+    assert len(data['pcap1']) == 2
+    response = client.post('/filter', json={'capture': '0' * 64})
+    assert response.status_code == 404
@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+
+import pytest
+
+from capture_store import CaptureStore, capture_key, is_capture_key
+
+KEY_A = 'a' * 64
+KEY_B = 'b' * 64
+KEY_C = 'c' * 64
+
+
+def payload(size):
+    # A message list whose JSON encoding is exactly ``size`` bytes
+    return ['x' * (size - 4)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CaptureStore(str(tmp_path), max_bytes=100, lease_seconds=0)
+
+
+def test_put_open_round_trip(store):
+    messages = [{'first_line': 'INVITE sip:bob SIP/2.0', 'call_id': '1', 'message': 'm', 'time': 1.5}]
+    assert store.put(KEY_A, messages)
+    with store.open(KEY_A) as loaded:
+        assert loaded == messages
+
+
+def test_open_unknown_or_invalid_key(store):
+    with store.open(KEY_A) as loaded:
+        assert loaded is None
+    for key in (['x'], 'A' * 64, '../index', None):
+        with store.open(key) as loaded:
+            assert loaded is None
+
+
+def test_capture_key_is_valid(tmp_path):
+    path = tmp_path / 'capture.pcap'
+    path.write_bytes(b'pcap data')
+    assert is_capture_key(capture_key(str(path)))
+
+
+def test_oversize_capture_not_stored(store):
+    assert not store.put(KEY_A, payload(200))
+    with store.open(KEY_A) as loaded:
+        assert loaded is None
+    assert not os.path.exists(store._data_path(KEY_A))
+
+
+def test_new_capture_not_evicted_on_insert(store):
+    assert store.put(KEY_A, payload(40))
+    assert store.put(KEY_B, payload(90))
+    with store.open(KEY_B) as loaded:
+        assert loaded == payload(90)
+    with store.open(KEY_A) as loaded:
+        assert loaded is None
+
+
+def test_pinned_capture_not_evicted(store):
+    assert store.put(KEY_A, payload(60))
+    with store.open(KEY_A):
+        assert not store.put(KEY_B, payload(60))
+    with store.open(KEY_A) as loaded:
+        assert loaded == payload(60)
+    with store.open(KEY_B) as loaded:
+        assert loaded is None
+
+
+def test_leased_capture_not_evicted(tmp_path):
+    store = CaptureStore(str(tmp_path), max_bytes=100, lease_seconds=60)
+    assert store.put(KEY_A, payload(60))
+    assert not store.put(KEY_B, payload(60))
+    with store.open(KEY_A) as loaded:
+        assert loaded == payload(60)
+
+
+def test_lru_eviction_order(store):
+    assert store.put(KEY_A, payload(40))
+    assert store.put(KEY_B, payload(40))
+    with store.open(KEY_A):
+        pass
+    assert store.put(KEY_C, payload(40))
+    with store.open(KEY_B) as loaded:
+        assert loaded is None
+    with store.open(KEY_A) as loaded:
+        assert loaded == payload(40)
+
+
+def _acquire_and_die(directory, key):
+    CaptureStore(directory, max_bytes=100, lease_seconds=0)._acquire(key)
+    os._exit(0)
+
+
+def test_refs_held_by_dead_pid_dropped(store):
+    assert store.put(KEY_A, payload(60))
+    worker = multiprocessing.get_context('fork').Process(target=_acquire_and_die, args=(store.directory, KEY_A))
+    worker.start()
+    worker.join()
+    assert store.put(KEY_B, payload(60))
+    with store.open(KEY_A) as loaded:
+        assert loaded is None
+
+
+def test_orphaned_files_removed_on_put(store):
+    assert store.put(KEY_A, payload(10))
+    orphans = [os.path.join(store.directory, 'sipcap-1234.tmp'), store._data_path(KEY_C)]
+    for path in orphans:
+        open(path, 'w').close()
+    assert store.put(KEY_B, payload(10))
+    assert not any(os.path.exists(path) for path in orphans)
+
+
+def test_put_leaves_foreign_files_alone(store):
+    assert store.put(KEY_A, payload(10))
+    foreign = [os.path.join(store.directory, name) for name in ('other_app.sock', 'notes.json', 'tmp1234.tmp')]
+    for path in foreign:
+        open(path, 'w').close()
+    os.mkdir(os.path.join(store.directory, KEY_C + '.json'))
+    assert store.put(KEY_B, payload(10))
+    assert all(os.path.exists(path) for path in foreign)
+    assert os.path.isdir(os.path.join(store.directory, KEY_C + '.json'))
+    with store.open(KEY_B) as loaded:
+        assert loaded == payload(10)
+
+
+def test_unreadable_index_keeps_pinned_data(store):
+    assert store.put(KEY_A, payload(10))
+    with store.open(KEY_A):
+        with open(store._index_path, 'w') as f:
+            f.write('{not json')
+        assert store.put(KEY_B, payload(10))
+        assert os.path.exists(store._data_path(KEY_A))
+
+
+def test_damaged_data_file_opens_as_none(store):
+    assert store.put(KEY_A, payload(10))
+    with open(store._data_path(KEY_A), 'w') as f:
+        f.write('[truncated')
+    with store.open(KEY_A) as loaded:
+        assert loaded is None
+    with store._locked_index() as (index, _):
+        assert index[KEY_A]['refs'] == {}
+
+
+def test_failed_write_leaves_no_temp_file(store, monkeypatch):
+    replace = os.replace
+
+    def fail_data_write(src, dst):
+        if dst == store._data_path(KEY_A):
+            raise OSError(28, 'No space left on device')
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', fail_data_write)
+    assert not store.put(KEY_A, payload(10))
+    assert sorted(os.listdir(store.directory)) == ['index.json', 'index.lock']